@@ -0,0 +1,125 @@
+import asyncio
+import collections
+import socket
+import threading
+from contextlib import contextmanager
+
+import paho.mqtt.client as mqtt
+import pytest
+
+MQTT_TOPIC = 'DVT/test_logger'
+# Loopback address rather than 'localhost', which can resolve to ::1 first and cost a lookup
+HOSTNAME = '127.0.0.1'
+
+def find_free_port():
+    """Ask the OS for a TCP port that is currently free on the loopback interface."""
+    with socket.socket() as sock:
+        sock.bind((HOSTNAME, 0))
+        return sock.getsockname()[1]
+
+@contextmanager
+def run_broker(port):
+    """Run an in-process amqtt broker on a background event loop for the duration of the with block."""
+    from amqtt.broker import Broker
+
+    config = {
+        'listeners': {'default': {'type': 'tcp', 'bind': f'{HOSTNAME}:{port}'}},
+        # Only anonymous auth: no $SYS publishing and no packet logging
+        'plugins': {'amqtt.plugins.authentication.AnonymousAuthPlugin': {'allow_anonymous': True}},
+    }
+
+    async def start():
+        broker = Broker(config)
+        await broker.start()  # Returns once the listener accepts connections
+        return broker
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        broker = asyncio.run_coroutine_threadsafe(start(), loop).result(timeout=5)
+        try:
+            yield broker
+        finally:
+            asyncio.run_coroutine_threadsafe(broker.shutdown(), loop).result(timeout=5)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+@pytest.fixture(scope="session")
+def mqtt_host():
+    """Address the session's broker listens on."""
+    return HOSTNAME
+
+@pytest.fixture(scope="session")
+def mqtt_topic():
+    """Topic the listener is subscribed to and received_payloads captures."""
+    return MQTT_TOPIC
+
+@pytest.fixture(scope="session")
+def mqtt_port():
+    """Port for the session's broker, picked per process so parallel workers don't collide."""
+    return find_free_port()
+
+@pytest.fixture(scope="session")
+def mqtt_broker(mqtt_port):
+    """Run one in-process MQTT broker for the whole test session."""
+    pytest.importorskip('amqtt', minversion='0.12')  # Older releases use another config format
+    with run_broker(mqtt_port) as broker:
+        yield broker
+
+@pytest.fixture(scope="session")
+def mqtt_listener(mqtt_broker, mqtt_port):
+    """Connected MQTT client subscribed to MQTT_TOPIC, shared by every test in the session.
+
+    Tests attach their own handler with message_callback_add(MQTT_TOPIC, ...).
+    """
+    subscribed = threading.Event()  # Set once the broker acknowledges the subscription
+    # amqtt speaks MQTT 3.1.1 only; the broker is new each session, so there are no
+    # stale retained messages or sessions to skip
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="test_listener",
+                         protocol=mqtt.MQTTv311)
+    client.on_subscribe = lambda *args: subscribed.set()
+    client.max_inflight_messages_set(100)
+    client.max_queued_messages_set(0)  # 0 means no limit
+    client.connect(HOSTNAME, mqtt_port, keepalive=60)  # Use HOSTNAME for local broker
+    # Deliver small packets immediately rather than waiting on Nagle's algorithm
+    client.socket().setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    client.subscribe(MQTT_TOPIC, qos=0)
+    client.loop_start()
+    try:
+        assert subscribed.wait(2.0), "listener subscription not acknowledged"
+        yield client
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+class PayloadLog(collections.deque):
+    """Deque of received payloads that lets a test block until enough have arrived."""
+
+    def __init__(self, maxlen=None):
+        super().__init__(maxlen=maxlen)
+        self._arrived = threading.Condition()
+
+    def append(self, payload):
+        with self._arrived:
+            super().append(payload)
+            self._arrived.notify_all()
+
+    def wait_for(self, count, timeout=None):
+        """Block until at least count payloads are held or timeout expires; return whether they are."""
+        with self._arrived:
+            return self._arrived.wait_for(lambda: len(self) >= count, timeout)
+
+@pytest.fixture
+def received_payloads(mqtt_listener):
+    """Raw payloads published to MQTT_TOPIC while the test runs, oldest first."""
+    payloads = PayloadLog(maxlen=10000)
+
+    def _capture_cb(client, userdata, message):
+        payloads.append(message.payload)
+
+    mqtt_listener.message_callback_add(MQTT_TOPIC, _capture_cb)
+    yield payloads
+    mqtt_listener.message_callback_remove(MQTT_TOPIC)
@@ -1,32 +1,81 @@
 import argparse
-import inspect
 import os
 import re
 import subprocess
 import sys
 from datetime import datetime
 from datetime import timedelta
+from functools import cached_property
 
 from dvttestkit import testKitUtils
 
 from OculusTestKit.decorators import singleton
 
+_UUID_RE = re.compile(r'^[0-9a-f]{32}\Z')
+# Sphinx and pytest cannot run argparse, arg_setup mocks the arguments for them instead
+_IS_DOC_BUILD = any(module in sys.modules for module in ("sphinx", "pytest"))
 
-def list_classes_in_module(module):
+
+# Classes that can be picked with a command line flag, see register()
+_SELECTORS = []
+
+
+def register(cls):
     """
-    List all classes defined in the current module.
+    Class decorator that adds a --<classname> selector flag for the class.
     """
-    return [name for name, obj in inspect.getmembers(module, inspect.isclass)
-            if obj.__module__ == module.__name__]
+    _SELECTORS.append(cls)
+    return cls
+
+
+def list_classes_in_module():
+    """
+    List the names of all classes registered as selectors.
+    """
+    return [cls.__name__ for cls in _SELECTORS]
+
+
+class EnvDefault(argparse.Action):
+    """
+    Argparse action that falls back to an environment variable when the option is not given.
+
+    The variable is read once, when the parser is built, and its name is appended to the help text.
+    With ``nargs=0`` the action behaves like ``store_true`` and the variable is read as a boolean,
+    so values such as "false" or "0" no longer count as set.
+    """
+
+    def __init__(self, envvar, default=None, nargs=None, help=None, **kwargs):
+        value = os.environ.get(envvar)
+        if value is not None:
+            default = value.strip().lower() in ("1", "true", "yes", "on") if nargs == 0 else value
+        if help is not None:
+            help = f"{help} [env: {envvar}]"
+        super().__init__(default=default, nargs=nargs, help=help, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        setattr(namespace, self.dest, True if self.nargs == 0 else values)
 
 
-@singleton
 class OculusTestKit:
+    _instance = None
+    _initialized = False
+    # Parsed arguments, shared by every arg_setup call
+    _env_cache = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
 
     def __init__(self):
         """
         Initialize the RegressionTestKit with optional settings.
+
+        Only the first call does any work; later calls return the same, already initialized instance.
         """
+        if self._initialized:
+            return
+        self._initialized = True
         self.logger = self.logger_setup()
         self.env = self.arg_setup()
 
@@ -53,57 +102,61 @@ class OculusTestKit:
         """
         Parse command line arguments.
 
+        The result is cached on the class, so the parser is only built once per process.
+
         :returns: Parsed command line arguments.
         :rtype: argparse.Namespace
         """
-        if not any(module in sys.modules for module in ["sphinx", "pytest"]):
+        if OculusTestKit._env_cache is not None:
+            return OculusTestKit._env_cache
+        if not _IS_DOC_BUILD:
             def _parse_args():
                 parser = argparse.ArgumentParser(
                     description=description,
                     prog=self.__class__.__name__,
                     formatter_class=argparse.RawDescriptionHelpFormatter
                 )
-                parser.add_argument("-a", "--auto", action="store_true",
-                                    default=os.getenv("RTK_AGENT_MODE", False),
+                parser.add_argument("-a", "--auto", action=EnvDefault, nargs=0,
+                                    envvar="RTK_AGENT_MODE", default=False,
                                     help="(bool) Enables Agent mode. This flag is for pipeline jobs and skips user prompting."
                                     )
                 parser.add_argument("-u", "--uuid", type=str,
-                                    default=os.getenv("RTK_UUID"),
+                                    action=EnvDefault, envvar="RTK_UUID",
                                     help="(str): Gateway DUT UUID. Default is RTK_UUID. "
                                          "EX. c9e3b8b3b3b3b3b3b3b3b3b3b3b3b3b"
                                     )
                 parser.add_argument("--fleet", type=str,
-                                    default=os.getenv("RTK_FLEET"),
+                                    action=EnvDefault, envvar="RTK_FLEET",
                                     help="(str) Fleet of gateways to query against. Default is the value of RTK_FLEET."
                                     )
                 parser.add_argument("--sensor_list", type=str, nargs='+',
                                     help="(list): List of sensor mac addresses to query against. Default is None."
                                     )
                 parser.add_argument("--output", type=str,
-                                    default=os.getenv("RTK_OUTPUT", "data"),
+                                    action=EnvDefault, envvar="RTK_OUTPUT", default="data",
                                     help="(str): Output folder path. Defaults to 'data/'"
                                     )
                 parser.add_argument("--retest", type=str,
-                                    default=os.getenv("RTK_RETEST", "tests/retest"),
+                                    action=EnvDefault, envvar="RTK_RETEST", default="tests/retest",
                                     help="(str): Output file name for retest lists. Default is 'tests/retest'."
                                     )
                 parser.add_argument("--ticket", type=str,
-                                    default=os.getenv("RTK_TICKET"),
+                                    action=EnvDefault, envvar="RTK_TICKET",
                                     help="(str): JIRA ticket number. Default is the value of the environment variable."
                                          "RTK_TICKET. EX. 'TDV-1234'."
                                     )
                 parser.add_argument("--file", type=str,
-                                    default=os.getenv("RTK_FILE"),
+                                    action=EnvDefault, envvar="RTK_FILE",
                                     help="(str): Various functions use this for input file names, "
                                          "Whitelist by default"
                                     )
                 parser.add_argument("--pubkey", type=str,
-                                    default=os.getenv("RTK_PNPK"),
+                                    action=EnvDefault, envvar="RTK_PNPK",
                                     help="(str): PubNub publish key. Default is the value of the "
                                          "environment variable PUBNUB_PUBLISH_KEY."
                                     )
                 parser.add_argument("--subkey", type=str,
-                                    default=os.getenv("RTK_PNSK"),
+                                    action=EnvDefault, envvar="RTK_PNSK",
                                     help="(str): PubNub subscribe key. Default is the value of the "
                                          "environment variable PUBNUB_SUBSCRIBE_KEY."
                                     )
@@ -111,8 +164,8 @@ class OculusTestKit:
                                     default=self.poll_date(),
                                     help="(str): End date for query. Default is the current date and time."
                                     )
-                parser.add_argument("--debug", action="store_true",
-                                    default=os.getenv("RTK_DEBUG", False),
+                parser.add_argument("--debug", action=EnvDefault, nargs=0,
+                                    envvar="RTK_DEBUG", default=False,
                                     help="Enable debug mode."
                                     )
                 parser.add_argument("-v", "--verbose", action="store_true",
@@ -120,12 +173,12 @@ class OculusTestKit:
                                     help="Enable verbose mode."
                                     )
                 parser.add_argument("--host", type=str,
-                                    default=os.getenv("RTK_HOST", "localhost"),
+                                    action=EnvDefault, envvar="RTK_HOST", default="localhost",
                                     help="(str): Host to connect to. Default is the value of the environment variable "
                                          "RTK_HOST."
                                     )
                 parser.add_argument("--port", type=int,
-                                    default=os.getenv("RTK_PORT", 8080),
+                                    action=EnvDefault, envvar="RTK_PORT", default=8080,
                                     help="(int): Port to connect to. Default is the value of the environment variable "
                                          "RTK_PORT."
                                     )
@@ -134,26 +187,26 @@ class OculusTestKit:
                                     help="(Show the test case in a browser."
                                     )
                 parser.add_argument("--mode", type=str,
-                                    default=os.getenv("RTK_MODE", "local"),
+                                    action=EnvDefault, envvar="RTK_MODE", default="local",
                                     help="(str): Mode to run in. Default is the value "
                                          "of the environment variable RTK_MODE."
                                     )
                 parser.add_argument("--id", type=int,
-                                    default=os.getenv("RTK_ID", -1),
+                                    action=EnvDefault, envvar="RTK_ID", default=-1,
                                     help="(int): Test monitor object ID. Default is the value of the environment variable RTK_ID."
                                     )
                 parser.add_argument("--tr-id", type=int,
                                     dest="tr_id",
-                                    default=os.getenv("RTK_TR_ID", -1),
+                                    action=EnvDefault, envvar="RTK_TR_ID", default=-1,
                                     help="(int): Test run ID. Default is the value of the environment variable RTK_TC_ID."
                                     )
                 parser.add_argument("--tc-id", type=int,
                                     dest="tc_id",
-                                    default=os.getenv("RTK_TC_ID", -1),
+                                    action=EnvDefault, envvar="RTK_TC_ID", default=-1,
                                     help="(int): Test case ID. Default is the value of the environment variable RTK_TC_ID."
                                     )
                 parser.add_argument("-m", "--milestone", type=int,
-                                    default=os.getenv("RTK_MILESTONE", -1),
+                                    action=EnvDefault, envvar="RTK_MILESTONE", default=-1,
                                     help="(int): Milestone ID. Default is the value of the environment variable RTK_MILESTONE."
                                     )
                 parser.add_argument("-d", "--desc", type=str,
@@ -166,7 +219,7 @@ class OculusTestKit:
                                     help="(int): When using CLI to update test results, This will mark the status as failed."
                                     )
                 parser.add_argument("--skip_time", type=int,
-                                    default=os.getenv("RTK_SKIP_TIME", 99),
+                                    action=EnvDefault, envvar="RTK_SKIP_TIME", default=99,
                                     help="(int): Default Time to skip tests before rerunning them in hours. Default is 99."
                                     )
                 parser.add_argument("--cli", action="store_true",
@@ -180,16 +233,15 @@ class OculusTestKit:
                                     )
                 # selector
                 group = parser.add_mutually_exclusive_group()
-                current_module = sys.modules[__name__]
-                print(sys.modules[__name__])
-                classes = list_classes_in_module(current_module)
+                classes = list_classes_in_module()
                 for cls in classes:
                     group.add_argument(f'--{cls.lower()}', action='store_true', help=f'(bool) Run {cls}')
                 group.add_argument('selector', type=str, nargs='?', default=None, help='(str) The class name or command to run')
 
                 return parser.parse_args()
 
-            return _parse_args()
+            OculusTestKit._env_cache = _parse_args()
+            return OculusTestKit._env_cache
         else:
             class MockThreadArgs:
                 """
@@ -232,7 +284,8 @@ class OculusTestKit:
                     self.tc_id = id or os.getenv("RTK_TC_ID")
                     self.skip_time = skip_time or 4
 
-            return MockThreadArgs()
+            OculusTestKit._env_cache = MockThreadArgs()
+            return OculusTestKit._env_cache
 
     def poll_date(self, time_hours: int = None):
         """
@@ -261,13 +314,15 @@ logger = _thread.logger
 class EnvData:
     """
     Singleton class to store environment variables.
+
+    Host details (balena_version, node, platform, python_version, tester) are
+    resolved on first access and cached on the instance.
     """
 
     def __init__(self):
         self.env = OculusTestKit().env
 
         self.auto: str = self.env.auto
-        self.balena_version: str = subprocess.check_output(["balena", "--version"]).decode("utf-8").strip()
         self.cli: bool = self.env.cli
         self.debug: bool = self.env.debug
         self.description: str = self.env.desc or None
@@ -277,15 +332,12 @@ class EnvData:
         self.id: int = self.env.id
         self.milestone: int = self.env.milestone
         self.mode: str = self.env.mode
-        self.node: str = os.uname().nodename
         self.output: str = self.env.output
-        self.platform: str = os.uname().version
         self.port: int = self.env.port
         self.previous_version_commit: str | None = None
         self.previous_version: str | None = None
         self.pubkey: str = self.env.pubkey
         self.push_on_exit = self.env.push_on_exit
-        self.python_version: str = sys.version
         self.retest: str = self.env.retest
         self.selector: str = self.env.selector
         self.sensor_list: list = self.env.sensor_list
@@ -297,7 +349,6 @@ class EnvData:
         self.tc_id: int = self.env.tc_id
         self.test_list: list | None = None
         self.test_result_status_id: int = 1
-        self.tester: str = os.getenv('RTK_BALENA_USER', os.getenv('USER', 'Unknown'))
         self.ticket: str = self.env.ticket
         self.tr_id: int = self.env.tr_id
         self.until: datetime = self.env.until
@@ -310,6 +361,48 @@ class EnvData:
             setattr(self, key, value)
         return self
 
+    @cached_property
+    def balena_version(self) -> str:
+        """
+        Version string reported by the balena CLI, resolved on first access.
+
+        :returns: The CLI version, or "unknown" if balena is not installed or does not answer in time.
+        :rtype: str
+        """
+        try:
+            result = subprocess.run(["balena", "--version"], capture_output=True, timeout=2, check=False)
+        except (OSError, subprocess.TimeoutExpired):
+            return "unknown"
+        return result.stdout.decode("utf-8").strip() or "unknown"
+
+    @cached_property
+    def node(self) -> str:
+        """
+        Network name of the host machine.
+        """
+        return os.uname().nodename
+
+    @cached_property
+    def platform(self) -> str:
+        """
+        Kernel version string of the host machine.
+        """
+        return os.uname().version
+
+    @cached_property
+    def python_version(self) -> str:
+        """
+        Version of the running interpreter.
+        """
+        return sys.version
+
+    @cached_property
+    def tester(self) -> str:
+        """
+        Name of the user running the tests.
+        """
+        return os.getenv('RTK_BALENA_USER', os.getenv('USER', 'Unknown'))
+
     @property
     def valid_uuid(self) -> str:
         """
@@ -321,6 +414,6 @@ class EnvData:
         # return bool(re.match(r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$', mac_address))
 
         if self.uuid is not None:
-            if re.match(r'^[0-9a-f]{32}$', self.uuid) is not None:
+            if _UUID_RE.match(self.uuid) is not None:
                 return self.uuid
             raise ValueError(f'UUID <{self.uuid}> is not in a valid format!')
@@ -1,18 +1,102 @@
-import errno
 import logging
 import os
+import sys
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
 import paho.mqtt.client as mqtt
-import paho.mqtt.publish as publish
 
 # Create utils specific fallback logger for Debugging debug mode
 logger = logging.getLogger(__name__)
 project = __name__
 fileDate = datetime.now().strftime("%Y-%m-%d")
+# Replaces MQTT wildcards in topics/payloads that post() could not publish
+_WILDCARD_TRANS = str.maketrans({'+': '_', '#': '_'})
 os.environ['ROOT_DIR'] = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), '..')
+# Connected clients shared between handlers, keyed by connection settings
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+# Longest a closing client waits for its queued records to reach the broker
+_DELIVERY_TIMEOUT = 2.0
+# post()'s own client, kept out of _CLIENTS so it never holds a handler's client open
+_post_client = None
+
+
+def _get_client(host, port, client_id='', keepalive=60, will=None, auth=None,
+                tls=None, protocol=mqtt.MQTTv311, transport='tcp'):
+    """
+    Return the shared client for these connection settings, connecting it on first use
+    :return: paho.mqtt.client.Client
+    """
+    key = (host, port, client_id, keepalive, repr(will), repr(auth),
+           repr(tls), protocol, transport)
+    with _CLIENTS_LOCK:
+        entry = _CLIENTS.get(key)
+        if entry is None:
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2,
+                                 client_id=client_id, protocol=protocol,
+                                 transport=transport)
+            # Same handling of auth and tls as paho.mqtt.publish.multiple
+            if auth:
+                if not auth.get('username'):
+                    raise KeyError("The 'username' key was not found, this is required for auth")
+                client.username_pw_set(auth['username'], auth.get('password'))
+            if tls is not None:
+                if isinstance(tls, dict):
+                    tls = dict(tls)
+                    insecure = tls.pop('insecure', False)
+                    client.tls_set(**tls)
+                    if insecure:
+                        client.tls_insecure_set(insecure)
+                else:
+                    client.tls_set_context(tls)
+            if will is not None:
+                client.will_set(**will)
+            client.connect_async(host, port, keepalive)
+            client.loop_start()
+            entry = _CLIENTS[key] = [client, 0]
+        entry[1] += 1
+        return entry[0]
+
+
+def _wait_for_delivery(client, timeout=_DELIVERY_TIMEOUT):
+    """
+    Wait until every queued publish is sent (and acked for QoS>0), or timeout expires
+    :return: bool
+    """
+    deadline = time.monotonic() + timeout
+    # _out_messages is a paho internal, stable across 2.x; see mqttlogger._wait_for_delivery
+    while client._out_messages or client.want_write():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _release_client(client):
+    """
+    Drop one reference to a shared client, disconnecting it once unused
+    :param client:
+    """
+    with _CLIENTS_LOCK:
+        for key, entry in _CLIENTS.items():
+            if entry[0] is client:
+                entry[1] -= 1
+                if entry[1] > 0:
+                    return
+                del _CLIENTS[key]
+                break
+    # disconnect() would drop records still queued in paho, deliver them first
+    if not _wait_for_delivery(client):
+        # Not through logging: this often runs while the loggers are shutting down
+        print(f'{project}: {len(client._out_messages)} record(s) not delivered to '
+              f'{client.host}:{client.port} within {_DELIVERY_TIMEOUT}s, dropping them',
+              file=sys.stderr)
+    client.disconnect()
+    client.loop_stop()
 
 
 class mqttHandler(logging.Handler):
@@ -39,12 +123,12 @@ class mqttHandler(logging.Handler):
         client_id (str): The client ID to use when connecting to the MQTT broker. If not specified,
             a random client ID will be generated.
         keepalive (int): The keepalive time, in seconds, for the MQTT connection. The default is 60.
-        will (str): A last will and testament message to send to the MQTT broker if the connection is
-            unexpectedly lost. The default is None.
-        auth (str): An optional username and password string to use when connecting to the MQTT broker.
-            The format of the string is 'username:password'. The default is None.
-        tls (str): An optional path to a file containing the TLS certificate for the MQTT broker. If
-            not specified, TLS encryption will not be used. The default is None.
+        will (dict): A last will and testament message to send to the MQTT broker if the connection is
+            unexpectedly lost, given as the keyword arguments of `will_set`. The default is None.
+        auth (dict): An optional username and password to use when connecting to the MQTT broker.
+            The format is {'username': ..., 'password': ...}. The default is None.
+        tls (dict): An optional dict of `tls_set` keyword arguments (or an `ssl.SSLContext`) for the
+            MQTT broker. If not specified, TLS encryption will not be used. The default is None.
         protocol (int): The MQTT protocol version to use. The default is MQTTv3.1.1.
         transport (str): The transport protocol to use. The default is 'tcp', which uses the standard
             TCP/IP protocol. Other options include 'websockets', which uses the WebSocket protocol.
@@ -57,12 +141,13 @@ class mqttHandler(logging.Handler):
         port (int): The port number to use when connecting to the MQTT broker.
         client_id (str): The client ID to use when connecting to the MQTT broker.
         keepalive (int): The keepalive time, in seconds, for the MQTT connection.
-        will (str): The last will and testament message to send to the MQTT broker if the connection
+        will (dict): The last will and testament message to send to the MQTT broker if the connection
             is unexpectedly lost.
-        auth (str): The username and password string to use when connecting to the MQTT broker.
-        tls (str): The path to the TLS certificate file for the MQTT broker.
+        auth (dict): The username and password to use when connecting to the MQTT broker.
+        tls (dict): The TLS settings for the MQTT broker.
         protocol (int): The MQTT protocol version to use.
         transport (str): The transport protocol to use.
+        client (paho.mqtt.client.Client): The persistent client used to publish records.
 
     """
 
@@ -74,10 +159,10 @@ class mqttHandler(logging.Handler):
             _port: int = int(os.environ.get('AWSPORT', 1884)),
             client_id: str = '',
             keepalive: int = 60,
-            will: str = None,
-            auth: str = None,
-            tls: str = None,
-            protocol: int = 3,
+            will: dict = None,
+            auth: dict = None,
+            tls: dict = None,
+            protocol: int = mqtt.MQTTv311,
             transport: str = 'tcp',
     ) -> object:
         logging.Handler.__init__(self)
@@ -94,36 +179,46 @@ class mqttHandler(logging.Handler):
         self.protocol = protocol
         self.transport = transport
 
+        self.client = _get_client(self.hostname, self.port, client_id,
+                                  keepalive, will, auth, tls, protocol,
+                                  transport)
+        self._publish = self.client.publish
+
     def emit(self, record):
         """
-        The emit method in this code is responsible for publishing a single formatted logging record to a broker and then disconnecting cleanly.
+        The emit method in this code is responsible for publishing a single formatted logging record to a broker.
         The method takes a single parameter record, which represents the logging record to be published.
 
         The purpose of this section of code is to allow for logging messages to be sent to a broker, where they can be consumed by other applications or services.
         This can be useful in distributed systems where log messages need to be centralized for monitoring and debugging purposes.
 
-        The emit method formats the logging record using the format method and then publishes the resulting message using the publish.single method.
-        The various parameters passed to publish.single specify details such as the topic to publish to, the quality of service, and authentication details.
-        After the message is published, the connection to the broker is cleanly disconnected.
+        The emit method formats the logging record using the format method and then publishes the resulting message on the
+        handler's persistent client. The connection is opened once in __init__ and its network loop runs in a background
+        thread, so no connect/disconnect round trip is paid per record.
 
         This code provides a convenient way to integrate logging functionality into a distributed system using a message broker.
         """
-        msg = self.format(record)
-        publish.single(
-            self.topic,
-            msg,
-            self.qos,
-            self.retain,
-            hostname=self.hostname,
-            port=self.port,
-            client_id=self.client_id,
-            keepalive=self.keepalive,
-            will=self.will,
-            auth=self.auth,
-            tls=self.tls,
-            protocol=self.protocol,
-            transport=self.transport
-        )
+        if self.client is None:
+            return  # Closed, the released client may belong to another handler by now
+        try:
+            # Without a formatter only the message is needed, unless Formatter would append a traceback
+            if self.formatter is None and record.exc_info is None and record.stack_info is None:
+                msg = record.getMessage()
+            else:
+                msg = self.format(record)
+            self._publish(self.topic, msg, self.qos, self.retain)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        """
+        Release the shared client, disconnecting it once no handler uses it.
+        """
+        if self.client is not None:
+            _release_client(self.client)
+            self.client = None
+            self._publish = None
+        logging.Handler.close(self)
 
 
 def establishBroker():
@@ -131,7 +226,7 @@ def establishBroker():
     Connect to the MQTT broker for logger mqttHandler stream
     :return:
     """
-    _client = mqtt.Client()
+    _client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
     _client.connect(host=os.environ.get('AWSIP', 'localhost'),
                     port=int(os.environ.get('AWSPORT', 1884))
                     )
@@ -152,12 +247,14 @@ def makeLogger(name: str = __name__, log_to_file: bool = False,
     _format = '%(asctime)s - %(module)s - %(message)s' if log_level == 'DEBUG' else '%(asctime)s - %(message)s'
 
     log = logging.getLogger(name)
+    # Already configured by an earlier call, don't stack another set of handlers
+    if log.handlers:
+        return log
     log.setLevel(log_level)
 
     if log_to_file:
         filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-TestKit.log"
-        _log = ensure_exists(
-            Path(os.environ['ROOT_DIR']).joinpath(f"data//{filename}"))
+        _log = ensure_exists(Path(os.environ['ROOT_DIR'], "data", filename))
         file_handler = logging.FileHandler(_log)
         file_handler.setFormatter(logging.Formatter(_format))
         log.addHandler(file_handler)
@@ -171,37 +268,51 @@ def makeLogger(name: str = __name__, log_to_file: bool = False,
     return log
 
 
-def post(topic: str, payload: str, retain: bool = False,
-         _client=establishBroker()):
+def _default_client():
+    """
+    Return post()'s client, connecting it on first use
+    :return: paho.mqtt.client.Client
+    """
+    global _post_client
+    if _post_client is None:
+        _post_client = establishBroker()
+        _post_client.loop_start()
+    return _post_client
+
+
+def post(topic: str, payload: str, retain: bool = False, _client=None):
     """
     Post msg to MQTT broker
 
     :type _client: object
     :type retain: bool
-    :param _client: Logging handler. By default, it is created by this module
+    :param _client: MQTT client. By default, the module's own client is connected on first use
     :param retain: Retain topic on broker
     :param topic: Project name
     :param payload: Sensor Data
     """
+    _client = _client or _default_client()
     topic = str(f'{project}/{topic}')
     payload = str(payload)
-    try:
-        _client.publish(topic=topic, payload=payload, qos=0, retain=retain)
-    except ValueError:
-        logger.warning(
-            f"pub Failed because of wildcard: {str(topic)}=:={str(payload)}")
-        logger.warning(f"Attempting fix...")
+    # Wildcards are rejected by publish, check for them up front instead of raising
+    if '+' not in topic and '#' not in topic:
         try:
-            tame_t = topic.replace("+", "_")
-            tame_topic = tame_t.replace("#", "_")
-            tame_p = payload.replace("+", "_")
-            tame_payload = tame_p.replace("#", "_")
-            _client.publish(topic=str(tame_topic), payload=str(tame_payload),
-                            qos=1, retain=retain)
-            logger.debug("Fix successful, Sending data...")
-        except Exception as error:
-            logger.warning(f"Fix Failed. Bug report sent.")
-            _client.publish(f"{project}/error", str(error), qos=1, retain=True)
+            _client.publish(topic=topic, payload=payload, qos=0, retain=retain)
+            return
+        except ValueError:
+            pass
+    logger.warning(
+        f"pub Failed because of wildcard: {str(topic)}=:={str(payload)}")
+    logger.warning(f"Attempting fix...")
+    try:
+        tame_topic = topic.translate(_WILDCARD_TRANS)
+        tame_payload = payload.translate(_WILDCARD_TRANS)
+        _client.publish(topic=tame_topic, payload=tame_payload,
+                        qos=1, retain=retain)
+        logger.debug("Fix successful, Sending data...")
+    except Exception as error:
+        logger.warning(f"Fix Failed. Bug report sent.")
+        _client.publish(f"{project}/error", str(error), qos=1, retain=True)
 
 def ensure_exists(path):
     """
@@ -209,10 +320,5 @@ def ensure_exists(path):
     :param path:
     :return:
     """
-    if not os.path.exists(os.path.dirname(path)):
-        try:
-            os.makedirs(os.path.dirname(path))
-        except OSError as exc:  # Guard against race condition
-            if exc.errno != errno.EEXIST:
-                raise
+    os.makedirs(os.path.dirname(path), exist_ok=True)
     return path
@@ -2,7 +2,6 @@
     Elemental Internal testing Software
     Utilities Package for TestKit
 """
-import errno
 import html
 import os
 import platform
@@ -22,8 +21,12 @@ import paho.mqtt.publish as publish
 logger = logging.getLogger(__name__)
 project = __name__
 fileDate = datetime.now().strftime("%Y-%m-%d")
+# Replaces MQTT wildcards in topics/payloads that post() could not publish
+_WILDCARD_TRANS = str.maketrans({'+': '_', '#': '_'})
 os.environ['ROOT_DIR'] = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), '..')
+# Client used by post() when none is given, see _default_client()
+_shared_client = None
 
 
 class mqttHandler(logging.Handler):
@@ -142,7 +145,7 @@ def establishBroker():
     Connect to the MQTT broker for logger mqttHandler stream
     :return:
     """
-    _client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    _client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
     _client.connect(host=os.environ.get('AWSIP', 'localhost'),
                     port=int(os.environ.get('AWSPORT', 1884))
                     )
@@ -165,12 +168,14 @@ def makeLogger(name: str = __name__, log_to_file: bool = False,
     logging.addLevelName(5, "VERBOSE")
 
     log = logging.getLogger(name)
+    # Already configured by an earlier call, don't stack another set of handlers
+    if log.handlers:
+        return log
     log.setLevel(log_level)
 
     if log_to_file:
         filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-TestKit.log"
-        _log = ensure_exists(
-            Path(os.environ['ROOT_DIR']).joinpath(f"data//{filename}"))
+        _log = ensure_exists(Path(os.environ['ROOT_DIR'], "data", filename))
         file_handler = logging.FileHandler(_log)
         file_handler.setFormatter(logging.Formatter(_format))
         log.addHandler(file_handler)
@@ -191,37 +196,55 @@ def makeLogger(name: str = __name__, log_to_file: bool = False,
     return log
 
 
-def post(topic: str, payload: str, retain: bool = False,
-         _client=establishBroker()):
+def _default_client():
+    """
+    Return the module's shared MQTT client, connecting it on first use.
+
+    The client is created lazily so importing this module never opens a broker connection,
+    and its network loop is started once so PUBACKs are drained in the background.
+    :return:
+    """
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = establishBroker()
+        _shared_client.loop_start()
+    return _shared_client
+
+
+def post(topic: str, payload: str, retain: bool = False, _client=None):
     """
     Post msg to MQTT broker
 
     :type _client: object
     :type retain: bool
-    :param _client: Logging handler. By default, it is created by this module
+    :param _client: MQTT client. By default, the module's shared client is connected on first use
     :param retain: Retain topic on broker
     :param topic: Project name
     :param payload: Sensor Data
     """
+    if _client is None:
+        _client = _default_client()
     topic = str(f'{project}/{topic}')
     payload = str(payload)
-    try:
-        _client.publish(topic=topic, payload=payload, qos=0, retain=retain)
-    except ValueError:
-        logger.warning(
-            f"pub Failed because of wildcard: {str(topic)}=:={str(payload)}")
-        logger.warning(f"Attempting fix...")
+    # Wildcards are rejected by publish, check for them up front instead of raising
+    if '+' not in topic and '#' not in topic:
         try:
-            tame_t = topic.replace("+", "_")
-            tame_topic = tame_t.replace("#", "_")
-            tame_p = payload.replace("+", "_")
-            tame_payload = tame_p.replace("#", "_")
-            _client.publish(topic=str(tame_topic), payload=str(tame_payload),
-                            qos=1, retain=retain)
-            logger.debug("Fix successful, Sending data...")
-        except Exception as error:
-            logger.warning(f"Fix Failed. Bug report sent.")
-            _client.publish(f"{project}/error", str(error), qos=1, retain=True)
+            _client.publish(topic=topic, payload=payload, qos=0, retain=retain)
+            return
+        except ValueError:
+            pass
+    logger.warning(
+        f"pub Failed because of wildcard: {str(topic)}=:={str(payload)}")
+    logger.warning(f"Attempting fix...")
+    try:
+        tame_topic = topic.translate(_WILDCARD_TRANS)
+        tame_payload = payload.translate(_WILDCARD_TRANS)
+        _client.publish(topic=tame_topic, payload=tame_payload,
+                        qos=1, retain=retain)
+        logger.debug("Fix successful, Sending data...")
+    except Exception as error:
+        logger.warning(f"Fix Failed. Bug report sent.")
+        _client.publish(f"{project}/error", str(error), qos=1, retain=True)
 
 
 def run_command(command: str) -> str:
@@ -244,13 +267,7 @@ def ensure_exists(path):
     :param path:
     :return:
     """
-    # pathlib.Path(path).mkdir(parents=True, exist_ok=True)
-    if not os.path.exists(os.path.dirname(path)):
-        try:
-            os.makedirs(os.path.dirname(path))
-        except OSError as exc:  # Guard against race condition
-            if exc.errno != errno.EEXIST:
-                raise
+    os.makedirs(os.path.dirname(path), exist_ok=True)
     return path
 
 
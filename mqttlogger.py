@@ -1,10 +1,16 @@
+import atexit
+import functools
 import logging
 import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
 import paho.mqtt.client as mqtt
-import paho.mqtt.publish as publish
 
 # Create utils specific fallback logger for Debugging debug mode
 logger = logging.getLogger(__name__)
@@ -12,6 +18,80 @@ project = __name__
 fileDate = datetime.now().strftime("%Y-%m-%d")
 os.environ['ROOT_DIR'] = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), '..')
+# Background listeners started by makeLogger, keyed by logger name
+_listeners = {}
+# Connected clients shared between handlers, keyed by connection settings
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+# Longest a closing client waits for its queued records to reach the broker
+_DELIVERY_TIMEOUT = 2.0
+
+
+def _get_client(host, port, client_id='', keepalive=60, will=None, auth=None,
+                tls=None, protocol=mqtt.MQTTv311, transport='tcp'):
+    """Return the shared client for these connection settings, connecting it on first use."""
+    key = (host, port, client_id, keepalive, repr(will), repr(auth),
+           repr(tls), protocol, transport)
+    with _CLIENTS_LOCK:
+        entry = _CLIENTS.get(key)
+        if entry is None:
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2,
+                                 client_id=client_id, protocol=protocol,
+                                 transport=transport)
+            # Same handling of auth and tls as paho.mqtt.publish.multiple
+            if auth:
+                if not auth.get('username'):
+                    raise KeyError("The 'username' key was not found, this is required for auth")
+                client.username_pw_set(auth['username'], auth.get('password'))
+            if tls is not None:
+                if isinstance(tls, dict):
+                    tls = dict(tls)
+                    insecure = tls.pop('insecure', False)
+                    client.tls_set(**tls)
+                    if insecure:
+                        client.tls_insecure_set(insecure)
+                else:
+                    client.tls_set_context(tls)
+            if will is not None:
+                client.will_set(**will)
+            client.connect_async(host, port, keepalive)
+            client.loop_start()
+            entry = _CLIENTS[key] = [client, 0]
+        entry[1] += 1
+        return entry[0]
+
+
+def _wait_for_delivery(client, timeout=_DELIVERY_TIMEOUT):
+    """Wait until every queued publish is sent (and acked for QoS>0), or timeout expires."""
+    deadline = time.monotonic() + timeout
+    # _out_messages holds QoS>0 publishes until acked, including ones made before connect.
+    # It is a paho internal (MQTTMessageInfo.wait_for_publish raises for those pre-connect
+    # publishes), stable across 2.x, which is one reason setup.py pins paho-mqtt<3.
+    while client._out_messages or client.want_write():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _release_client(client):
+    """Drop one reference to a shared client, disconnecting it once unused."""
+    with _CLIENTS_LOCK:
+        for key, entry in _CLIENTS.items():
+            if entry[0] is client:
+                entry[1] -= 1
+                if entry[1] > 0:
+                    return
+                del _CLIENTS[key]
+                break
+    # disconnect() would drop records still queued in paho, deliver them first
+    if not _wait_for_delivery(client):
+        # Not through logging: this often runs while the loggers are shutting down
+        print(f'mqttlogger: {len(client._out_messages)} record(s) not delivered to '
+              f'{client.host}:{client.port} within {_DELIVERY_TIMEOUT}s, dropping them',
+              file=sys.stderr)
+    client.disconnect()
+    client.loop_stop()
 
 
 class mqttHandler(logging.Handler):
@@ -25,13 +105,17 @@ class mqttHandler(logging.Handler):
             _port: int = int(os.environ.get('AWSPORT', 1884)),
             client_id: str = '',
             keepalive: int = 60,
-            will: str = None,
-            auth: str = None,
-            tls: str = None,
-            protocol: int = 3,
+            will: dict = None,
+            auth: dict = None,
+            tls: dict = None,
+            protocol: int = mqtt.MQTTv311,
             transport: str = 'tcp',
     ) -> object:
         logging.Handler.__init__(self)
+        # publish() would reject these on every record; fail once, up front
+        if not topic or '+' in topic or '#' in topic \
+                or len(topic.encode('utf-8')) > 65535:
+            raise ValueError(f'Invalid MQTT publish topic: {topic!r}')
         self.topic = topic
         self.qos = qos
         self.retain = retain
@@ -45,71 +129,182 @@ class mqttHandler(logging.Handler):
         self.protocol = protocol
         self.transport = transport
 
+        self.client = _get_client(self.hostname, self.port, client_id,
+                                  keepalive, will, auth, tls, protocol,
+                                  transport)
+        self._publish = self.client.publish
+
     def emit(self, record):
         """Publish a single formatted logging record to a broker."""
-        msg = self.format(record)
-        publish.single(
-            self.topic,
-            msg,
-            self.qos,
-            self.retain,
-            hostname=self.hostname,
-            port=self.port,
-            client_id=self.client_id,
-            keepalive=self.keepalive,
-            will=self.will,
-            auth=self.auth,
-            tls=self.tls,
-            protocol=self.protocol,
-            transport=self.transport
-        )
+        if self.client is None:
+            return  # Closed, the released client may belong to another handler by now
+        try:
+            # Without a formatter only the message is needed, unless Formatter would append a traceback
+            if self.formatter is None and record.exc_info is None and record.stack_info is None:
+                msg = record.getMessage()
+            else:
+                msg = self.format(record)
+            self._publish(self.topic, msg, self.qos, self.retain)
+        except Exception:
+            self.handleError(record)
+
+    def handle_batch(self, records):
+        """Publish several records back to back under a single lock acquisition."""
+        records = [record for record in records if self.filter(record)]
+        if not records:
+            return
+        self.acquire()
+        try:
+            for record in records:
+                self.emit(record)
+        finally:
+            self.release()
+
+    def close(self):
+        """Release the shared client, disconnecting it once no handler uses it."""
+        if self.client is not None:
+            _release_client(self.client)
+            self.client = None
+            self._publish = None
+        logging.Handler.close(self)
+
+
+class _BatchQueueListener(QueueListener):
+    """QueueListener that drains up to batch_size queued records per wake-up.
+
+    Handlers that provide handle_batch (such as mqttHandler) receive the whole
+    batch at once, others are called once per record as usual.
+    """
+
+    def __init__(self, log_queue, *handlers, respect_handler_level=False,
+                 batch_size=100):
+        QueueListener.__init__(self, log_queue, *handlers,
+                               respect_handler_level=respect_handler_level)
+        self.batch_size = batch_size
+
+    def handle_batch(self, records):
+        """Dispatch a batch of records to every handler."""
+        for handler in self.handlers:
+            if self.respect_handler_level:
+                batch = [r for r in records if r.levelno >= handler.level]
+            else:
+                batch = records
+            if not batch:
+                continue
+            if hasattr(handler, 'handle_batch'):
+                handler.handle_batch(batch)
+            else:
+                for record in batch:
+                    handler.handle(record)
+
+    def _monitor(self):
+        has_task_done = hasattr(self.queue, 'task_done')
+        while True:
+            # Block for the first record, then take whatever else is already queued
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            records = []
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                    break
+                records.append(self.prepare(record))
+            if records:
+                self.handle_batch(records)
+            if has_task_done:
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                break
 
 
 def establishBroker():
     """Connect to the MQTT broker for logger mqttHandler stream."""
-    _client = mqtt.Client()
+    _client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
     _client.connect(host=os.environ.get('AWSIP', 'localhost'),
                     port=int(os.environ.get('AWSPORT', 1884))
                     )
     return _client
 
 
+@functools.lru_cache(maxsize=8)
+def _formatter(fmt: str) -> logging.Formatter:
+    """Return a Formatter for fmt, shared by every handler that uses it."""
+    return logging.Formatter(fmt)
+
+
 def makeLogger(name: str = __name__, log_to_file: bool = False,
-               log_level: str = 'DEBUG', hostname=None) -> logging.Logger:
-    """Create the project wide logger."""
+               log_level: str = 'DEBUG', hostname=None,
+               port=None, lean_records: bool = False) -> logging.Logger:
+    """Create the project wide logger.
+
+    lean_records stops the logging module from collecting thread and process
+    details for every LogRecord. This is process wide, so only set it when no
+    format in the application uses %(thread)s, %(threadName)s, %(process)s or
+    %(processName)s.
+    """
     # Check if the logger already exists
     log = logging.getLogger(name)
-    if log.hasHandlers():
+    if log.handlers:
         return log
 
     name = name.replace(".", "/")
     _format = '%(asctime)s - %(module)s - %(message)s' if log_level == 'DEBUG' else '%(asctime)s - %(message)s'
 
     log.setLevel(log_level)
+    if lean_records:
+        # None of the formats used here print them; caller lookup stays on for %(module)s
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+    handlers = []
 
     if log_to_file:
         filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-TestKit.log"
-        _log = ensure_exists(
-            Path(os.environ['ROOT_DIR']).joinpath(f"data//{filename}"))
+        _log = ensure_exists(Path(os.environ['ROOT_DIR'], "data", filename))
         file_handler = logging.FileHandler(_log)
-        file_handler.setFormatter(logging.Formatter(_format))
-        log.addHandler(file_handler)
+        file_handler.setFormatter(_formatter(_format))
+        handlers.append(file_handler)
 
     stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(logging.Formatter(_format))
-    log.addHandler(stream_handler)
+    stream_handler.setFormatter(_formatter(_format))
+    handlers.append(stream_handler)
+
+    my_handler = mqttHandler(
+        _hostName=hostname or os.environ.get('AWSIP', 'localhost'),
+        _port=port or int(os.environ.get('AWSPORT', 1884)),
+        topic=f'DVT/{name}')
+    handlers.append(my_handler)
 
-    my_handler = mqttHandler(_hostName=hostname, topic=f'DVT/{name}')
-    log.addHandler(my_handler)
+    # Only enqueue on the caller's thread; handlers run in batches on the listener thread
+    log_queue = queue.Queue(-1)
+    log.addHandler(QueueHandler(log_queue))
+    listener = _BatchQueueListener(log_queue, *handlers,
+                                   respect_handler_level=True)
+    listener.start()
+    _listeners[log.name] = listener
     return log
 
 
+@atexit.register
+def _stop_listeners():
+    """Hand queued records to their handlers, then close the handlers before exit."""
+    # Registered after logging's own shutdown hook, so this runs first. Close the
+    # handlers here: once _listeners is cleared nothing may keep them alive for
+    # logging.shutdown() to close, and only mqttHandler.close() releases its client.
+    for listener in _listeners.values():
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    _listeners.clear()
+
+
 def ensure_exists(path):
     """Accepts path to file, then creates the directory path if it does not exist."""
-    if not os.path.exists(os.path.dirname(path)):
-        try:
-            os.makedirs(os.path.dirname(path))
-        except OSError as exc:  # Guard against race condition
-            if exc.errno != errno.EEXIST:
-                raise
+    os.makedirs(os.path.dirname(path), exist_ok=True)
     return path
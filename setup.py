@@ -1,30 +1,41 @@
-from setuptools import setup, find_packages
+from pathlib import Path
+
+from setuptools import setup
+
+
+def _readme():
+    """Return README.md next to this file as the long description."""
+    return Path(__file__).with_name('README.md').read_text(encoding='utf-8')
 
 setup(
     name='mqttloghandler',
     version='0.1.0',
     description='A custom logging handler that publishes messages to an MQTT broker.',
-    long_description=open('README.md').read(),
+    long_description=_readme(),
     long_description_content_type='text/markdown',
     author='Dan Edens',
     author_email='danedens31@gmail.com',
     url='https://github.com/DanEdens/mqttloghandler',  # Replace with your GitHub repo URL
-    packages=find_packages(),
+    py_modules=['mqttlogger'],  # Single module at the top level, nothing to discover
+    zip_safe=False,
     install_requires=[
-        'paho-mqtt>=1.5.1',
+        'paho-mqtt>=2.1,<3',
     ],
+    extras_require={
+        # The in-process test broker needs amqtt 0.12's config format, which needs Python 3.10+
+        'test': ['pytest', 'amqtt>=0.12; python_version >= "3.10"'],
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
         'Programming Language :: Python :: 3.10',
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
-    python_requires='>=3.7',
+    python_requires='>=3.8',
     license='MIT',
     keywords='mqtt logging handler',
 )
@@ -1,82 +1,72 @@
-import subprocess
-import time
 import logging
-import os
-import threading
-from mqttlogger import makeLogger
-import paho.mqtt.client as mqtt
-
-CONFIG_FILE_PATH = 'mosquitto_test.conf'
-MQTT_PORT = 3003
-MQTT_TOPIC = 'DVT/test_logger'
-HOSTNAME = 'localhost'  # Define the hostname for the MQTT broker
-
-_listener_client = None  # Global variable to hold the singleton MQTT client
+import subprocess
+import sys
+from pathlib import Path
 
-def generate_mosquitto_config():
-    """Generate a Mosquitto configuration file to allow publishes on port 3003."""
-    config_content = f"""
-    listener {MQTT_PORT}
-    allow_anonymous true
-    """
-    with open(CONFIG_FILE_PATH, 'w') as config_file:
-        config_file.write(config_content)
+from mqttlogger import makeLogger, mqttHandler
 
-def start_mosquitto_broker():
-    """Start a local Mosquitto broker with the generated configuration."""
-    generate_mosquitto_config()
-    process = subprocess.Popen(['mosquitto', '-c', CONFIG_FILE_PATH],
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE)
-    time.sleep(2)  # Give the broker time to start
-    return process
+BURST_SIZE = 100
 
-def stop_mosquitto_broker(process):
-    """Stop the Mosquitto broker."""
-    process.terminate()
-    process.wait()
-    os.remove(CONFIG_FILE_PATH)  # Clean up the config file after use
+def wait_for_payloads(payloads, count, timeout=2.0):
+    """Wait until at least count messages have been received into payloads."""
+    # Woken by the subscriber callback on each message instead of polling
+    return payloads.wait_for(count, timeout)
 
-def on_message(client, userdata, message):
-    """Callback function to handle received messages."""
-    print(f"Received message: {message.payload.decode()} on topic {message.topic}")
+def test_logging(received_payloads, mqtt_host, mqtt_port):
+    """Test the mqttlogger by sending a log message."""
+    logger = makeLogger(name='test_logger', log_to_file=False, log_level='DEBUG',
+                        hostname=mqtt_host, port=mqtt_port)
+    logger.info("Test message to MQTT broker")
 
-def start_mqtt_listener():
-    """Start an MQTT client to listen for messages."""
-    global _listener_client
-    if _listener_client is not None:
-        return _listener_client
+    # Verify the message was published
+    assert wait_for_payloads(received_payloads, 1), "message not received"
+    # Payloads stay bytes in the callback, only decode them here for the failure message
+    assert b"Test message" in received_payloads[0], \
+        f"unexpected payload: {received_payloads[0].decode(errors='replace')}"
 
-    client = mqtt.Client()
-    client.on_message = on_message
-    client.connect(HOSTNAME, MQTT_PORT)  # Use HOSTNAME for local broker
-    client.subscribe(MQTT_TOPIC)
-    client.loop_start()
-    _listener_client = client
-    return client
+def test_logging_burst(received_payloads, mqtt_host, mqtt_port):
+    """Test that a burst of log records all reach the broker."""
+    logger = makeLogger(name='test_logger', log_to_file=False, log_level='DEBUG',
+                        hostname=mqtt_host, port=mqtt_port)
+    for i in range(BURST_SIZE):
+        logger.info(f"msg-{i}")
 
-def stop_mqtt_listener():
-    """Stop the MQTT client."""
-    global _listener_client
-    if _listener_client is not None:
-        _listener_client.loop_stop()
-        _listener_client.disconnect()
-        _listener_client = None
+    assert wait_for_payloads(received_payloads, BURST_SIZE), \
+        f"only {len(received_payloads)} of {BURST_SIZE} messages received"
+    assert b"msg-0" in received_payloads[0], \
+        f"burst arrived out of order: {received_payloads[0].decode(errors='replace')}"
 
-def test_logging():
-    """Test the mqttlogger by sending a log message."""
-    logger = makeLogger(name='test_logger', log_to_file=False, log_level='DEBUG', hostname=HOSTNAME)
-    logger.info("Test message to MQTT broker")
+def test_logging_before_exit(received_payloads, mqtt_host, mqtt_port):
+    """Test that records logged right before the process exits still reach the broker."""
+    script = (
+        "import sys\n"
+        "from mqttlogger import makeLogger\n"
+        "logger = makeLogger(name='test_logger', log_to_file=False, log_level='INFO',\n"
+        "                    hostname=sys.argv[1], port=int(sys.argv[2]))\n"
+        f"for i in range({BURST_SIZE}):\n"
+        "    logger.info(f'exit-{i}')\n"
+    )
+    subprocess.run([sys.executable, '-c', script, mqtt_host, str(mqtt_port)],
+                   cwd=Path(__file__).parent, check=True, timeout=30,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-    # Verify the message was published
-    print("Log message sent to MQTT broker.")
+    assert wait_for_payloads(received_payloads, BURST_SIZE), \
+        f"only {len(received_payloads)} of {BURST_SIZE} records logged before exit received"
 
-if __name__ == '__main__':
-    broker_process = start_mosquitto_broker()
-    listener_client = start_mqtt_listener()
+def test_logging_exception(received_payloads, mqtt_host, mqtt_port, mqtt_topic):
+    """Test that a directly attached handler publishes the traceback of a logged exception."""
+    handler = mqttHandler(_hostName=mqtt_host, _port=mqtt_port, topic=mqtt_topic)
+    logger = logging.getLogger('test_logging_exception')
+    logger.addHandler(handler)
     try:
-        test_logging()
-        time.sleep(2)  # Allow time for the message to be received
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logger.exception("Logged failure")
+
+        assert wait_for_payloads(received_payloads, 1), "message not received"
+        assert b"RuntimeError: boom" in received_payloads[0], \
+            f"traceback missing from payload: {received_payloads[0].decode(errors='replace')}"
     finally:
-        stop_mqtt_listener()
-        stop_mosquitto_broker(broker_process)
+        logger.removeHandler(handler)
+        handler.close()